@@ -1,17 +1,37 @@
 import os
 import datetime
 import json
-from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify
+import bisect
+import gzip
+import hashlib
+import hmac
+import math
+import mimetypes
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from flask import Flask, request, redirect, url_for, session, jsonify, send_from_directory, has_request_context, g
 from jinja2 import Template
 from werkzeug.security import generate_password_hash, check_password_hash
 from textblob import TextBlob
 from collections import defaultdict
 import logging
+import click
 import psycopg2
+import psycopg2.errors
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 import nltk
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 load_dotenv()
 
 # Download required NLTK data
@@ -51,7 +71,7 @@ INDEX_TEMPLATE = """
 <html>
 <head>
     <title>Mood Bite</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('bootstrap.min.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-light bg-light">
@@ -70,7 +90,7 @@ INDEX_TEMPLATE = """
             <a href="/signup" class="btn btn-primary btn-lg">Get Started</a>
         </div>
     </div>
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+    <script src="{{ asset_url('bootstrap.bundle.min.js') }}"></script>
 </body>
 </html>
 """
@@ -80,7 +100,7 @@ SIGNUP_TEMPLATE = """
 <html>
 <head>
     <title>Sign Up - Mood Bite</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('bootstrap.min.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-light bg-light">
@@ -123,7 +143,7 @@ LOGIN_TEMPLATE = """
 <html>
 <head>
     <title>Login - Mood Bite</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('bootstrap.min.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-light bg-light">
@@ -162,7 +182,7 @@ DASHBOARD_TEMPLATE = """
 <html>
 <head>
     <title>Dashboard - Mood Bite</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('bootstrap.min.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-light bg-light">
@@ -219,7 +239,7 @@ LOG_FOOD_TEMPLATE = """
 <html>
 <head>
     <title>Log Food - Mood Bite</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('bootstrap.min.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-light bg-light">
@@ -241,7 +261,8 @@ LOG_FOOD_TEMPLATE = """
                 <form method="POST">
                     <div class="mb-3">
                         <label class="form-label">Food Name</label>
-                        <input type="text" class="form-control" name="food_name" required>
+                        <input type="text" class="form-control" name="food_name" list="food-suggestions" autocomplete="off" required>
+                        <datalist id="food-suggestions"></datalist>
                     </div>
                     <div class="mb-3">
                         <label class="form-label">Calories (optional)</label>
@@ -253,6 +274,30 @@ LOG_FOOD_TEMPLATE = """
             </div>
         </div>
     </div>
+    <script>
+    const foodInput = document.querySelector('input[name="food_name"]');
+    let suggestTimer = null;
+    foodInput.addEventListener('input', function() {
+        clearTimeout(suggestTimer);
+        suggestTimer = setTimeout(fetchSuggestions, 150);
+    });
+    function fetchSuggestions() {
+        const query = foodInput.value.trim();
+        if (!query) return;
+
+        fetch('/api/foods/suggest?q=' + encodeURIComponent(query))
+        .then(res => res.json())
+        .then(data => {
+            const list = document.getElementById('food-suggestions');
+            list.innerHTML = '';
+            (data.suggestions || []).forEach(food => {
+                const option = document.createElement('option');
+                option.value = food.name;
+                list.appendChild(option);
+            });
+        });
+    }
+    </script>
 </body>
 </html>
 """
@@ -262,7 +307,7 @@ LOG_MOOD_TEMPLATE = """
 <html>
 <head>
     <title>Log Mood - Mood Bite</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('bootstrap.min.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-light bg-light">
@@ -309,7 +354,7 @@ CHAT_TEMPLATE = """
 <html>
 <head>
     <title>AI Chat - Mood Bite</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('bootstrap.min.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-light bg-light">
@@ -368,7 +413,7 @@ INSIGHTS_TEMPLATE = """
 <html>
 <head>
     <title>Insights - Mood Bite</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link href="{{ asset_url('bootstrap.min.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-light bg-light">
@@ -392,18 +437,111 @@ INSIGHTS_TEMPLATE = """
 </html>
 """
 
+# Static assets and response compression
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+VENDOR_DIR = os.path.join(STATIC_DIR, 'vendor')
+ASSETS_DIR = os.path.join(STATIC_DIR, 'assets')
+ASSET_MANIFEST_PATH = os.path.join(ASSETS_DIR, 'manifest.json')
+
+# Upstream sources for the vendored assets; only fetched by `flask build-assets`
+VENDOR_ASSETS = {
+    'bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js'
+}
+
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json'}
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+def load_asset_manifest():
+    try:
+        with open(ASSET_MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logger.warning("No asset manifest found, run `flask build-assets`. Falling back to CDN URLs.")
+        return {}
+
+asset_manifest = load_asset_manifest()
+
+def asset_url(name):
+    fingerprinted = asset_manifest.get(name)
+    if fingerprinted:
+        return f"/assets/{fingerprinted}"
+    return VENDOR_ASSETS[name]
+
+def build_assets():
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+
+    manifest = {}
+    for name, source_url in VENDOR_ASSETS.items():
+        vendor_path = os.path.join(VENDOR_DIR, name)
+        if not os.path.exists(vendor_path):
+            logger.info(f"Downloading {source_url}")
+            with urllib.request.urlopen(source_url, timeout=30) as resp:
+                data = resp.read()
+            with open(vendor_path, 'wb') as f:
+                f.write(data)
+
+        with open(vendor_path, 'rb') as f:
+            data = f.read()
+
+        base, ext = name.rsplit('.', 1)
+        fingerprinted = f"{base}.{hashlib.sha256(data).hexdigest()[:12]}.{ext}"
+        asset_path = os.path.join(ASSETS_DIR, fingerprinted)
+
+        with open(asset_path, 'wb') as f:
+            f.write(data)
+        with open(asset_path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(asset_path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+        manifest[name] = fingerprinted
+
+    with open(ASSET_MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+@lru_cache(maxsize=None)
+def compile_template(source):
+    return Template(source)
+
+def render_page(template, **context):
+    return compile_template(template).render(asset_url=asset_url, **context)
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
 # Database functions
+def normalize_database_url(database_url):
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
 def get_database_url():
     return os.environ.get('DATABASE_URL', 'postgresql://localhost/mood_bite')
 
+def get_replica_urls():
+    urls = os.environ.get('DATABASE_REPLICA_URLS', '')
+    return [normalize_database_url(url.strip()) for url in urls.split(',') if url.strip()]
+
 def init_db():
-    database_url = get_database_url()
-    if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    database_url = normalize_database_url(get_database_url())
 
     conn = psycopg2.connect(database_url)
     cursor = conn.cursor()
 
+    # Every gunicorn worker runs this at import; only one may migrate at a time
+    cursor.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEMA_LOCK_ID,))
+
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
         id SERIAL PRIMARY KEY,
@@ -415,50 +553,938 @@ def init_db():
     ''')
 
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS food_logs (
+    CREATE TABLE IF NOT EXISTS foods (
         id SERIAL PRIMARY KEY,
-        user_id INTEGER NOT NULL,
-        food_name TEXT NOT NULL,
-        calories INTEGER,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
+        name TEXT UNIQUE NOT NULL,
+        display_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
     ''')
 
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS mood_logs (
-        id SERIAL PRIMARY KEY,
+    for table in LOG_TABLES:
+        create_log_table(cursor, table)
+
+    migrate_food_logs_to_catalog(cursor)
+
+    for table in LOG_TABLES:
+        migrate_to_partitioned(cursor, table)
+        ensure_log_partitions(cursor, table)
+
+    create_rollup_tables(cursor)
+
+    conn.commit()
+
+    # pg_trgm may not be installable on every host; autocomplete still works without it
+    global trigram_available
+    try:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEMA_LOCK_ID,))
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute('CREATE INDEX IF NOT EXISTS foods_name_trgm_idx ON foods USING gin (name gin_trgm_ops)')
+        conn.commit()
+        trigram_available = True
+    except psycopg2.Error as e:
+        conn.rollback()
+        trigram_available = False
+        logger.warning(f"pg_trgm unavailable, fuzzy food suggestions disabled: {str(e)}")
+
+    conn.close()
+
+    global partitions_ensured_for
+    partitions_ensured_for = month_start(datetime.datetime.now())
+
+# Log tables are range partitioned by month on timestamp, with a DEFAULT
+# partition catching anything outside the pre-created months
+LOG_TABLES = {
+    'food_logs': '''
+        user_id INTEGER NOT NULL,
+        food_id INTEGER NOT NULL,
+        calories INTEGER,''',
+    'mood_logs': '''
         user_id INTEGER NOT NULL,
         mood TEXT NOT NULL,
-        intensity INTEGER NOT NULL,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS chat_logs (
-        id SERIAL PRIMARY KEY,
+        intensity INTEGER NOT NULL,''',
+    'chat_logs': '''
         user_id INTEGER NOT NULL,
         message TEXT NOT NULL,
         response TEXT NOT NULL,
-        detected_mood TEXT,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
+        detected_mood TEXT,'''
+}
+LOG_TABLE_FOREIGN_KEYS = {
+    'food_logs': ['FOREIGN KEY (user_id) REFERENCES users (id)', 'FOREIGN KEY (food_id) REFERENCES foods (id)'],
+    'mood_logs': ['FOREIGN KEY (user_id) REFERENCES users (id)'],
+    'chat_logs': ['FOREIGN KEY (user_id) REFERENCES users (id)']
+}
+
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 3))
+RECENT_LOG_MONTHS = int(os.environ.get('RECENT_LOG_MONTHS', 3))
+LOG_RETENTION_MONTHS = int(os.environ.get('LOG_RETENTION_MONTHS', 12))
+LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+
+# pg_advisory_xact_lock key serializing schema changes across workers and the CLI jobs
+SCHEMA_LOCK_ID = 7314002
+
+# Month this worker last created upcoming partitions for
+partitions_ensured_for = None
+partitions_lock = threading.Lock()
+
+def month_start(value, months=0):
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime.datetime(month_index // 12, month_index % 12 + 1, 1)
+
+def partition_name(table, start):
+    return f"{table}_p{start.year:04d}{start.month:02d}"
+
+def recent_log_cutoff():
+    # Aligned to a month boundary so the planner can prune whole partitions
+    return month_start(datetime.datetime.now(), -(RECENT_LOG_MONTHS - 1))
+
+def create_log_table(cursor, table):
+    foreign_keys = ''.join(f",\n        {fk}" for fk in LOG_TABLE_FOREIGN_KEYS[table])
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id SERIAL,{LOG_TABLES[table]}
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, timestamp){foreign_keys}
+    ) PARTITION BY RANGE (timestamp)
+    ''')
+
+    # A pre-partitioning table is converted by migrate_to_partitioned, which calls this again
+    cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', (table,))
+    if cursor.fetchone()[0] != 'p':
+        return
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_user_timestamp_idx ON {table} (user_id, timestamp DESC)')
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT')
+
+def create_log_partition(cursor, table, start):
+    name = partition_name(table, start)
+    end = month_start(start, 1)
+    cursor.execute('SELECT to_regclass(%s)', (name,))
+    if cursor.fetchone()[0] is not None:
+        return
+
+    default = f"{table}_default"
+    cursor.execute(
+        f'SELECT 1 FROM {default} WHERE timestamp >= %s AND timestamp < %s LIMIT 1',
+        (start, end)
+    )
+    if not cursor.fetchone():
+        cursor.execute(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)', (start, end))
+        return
+
+    # Rows for this month already landed in the default partition; move them over
+    logger.warning(f"Moving {table} rows for {start:%Y-%m} out of the default partition.")
+    cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {default}')
+    cursor.execute(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)', (start, end))
+    cursor.execute(f'INSERT INTO {name} SELECT * FROM {default} WHERE timestamp >= %s AND timestamp < %s', (start, end))
+    cursor.execute(f'DELETE FROM {default} WHERE timestamp >= %s AND timestamp < %s', (start, end))
+    cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT')
+
+def ensure_log_partitions(cursor, table, first_month=None):
+    current = month_start(datetime.datetime.now())
+    start = min(first_month or current, current)
+    while start <= month_start(current, PARTITION_MONTHS_AHEAD):
+        create_log_partition(cursor, table, start)
+        start = month_start(start, 1)
+
+def ensure_current_partitions():
+    """Create upcoming partitions once per month per worker, without relying on the archive job."""
+    global partitions_ensured_for
+    current = month_start(datetime.datetime.now())
+    if partitions_ensured_for == current:
+        return
+
+    with partitions_lock:
+        if partitions_ensured_for == current:
+            return
+        try:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEMA_LOCK_ID,))
+                for table in LOG_TABLES:
+                    ensure_log_partitions(cursor, table)
+                conn.commit()
+            finally:
+                conn.close()
+        except psycopg2.Error as e:
+            # Inserts still succeed via the default partition; retry on the next write
+            logger.error(f"Error creating upcoming log partitions: {str(e)}")
+            return
+        partitions_ensured_for = current
+
+def list_log_partitions(cursor, table):
+    cursor.execute('''
+    SELECT child.relname FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.oid = to_regclass(%s)
+    ORDER BY child.relname
+    ''', (table,))
+    partitions = []
+    for (name,) in cursor.fetchall():
+        if name == f"{table}_default":
+            continue
+        suffix = name[len(table) + 2:]
+        partitions.append((name, datetime.datetime(int(suffix[:4]), int(suffix[4:6]), 1)))
+    return partitions
+
+def migrate_to_partitioned(cursor, table):
+    # Tables created before partitioning are plain heap tables (relkind 'r')
+    cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', (table,))
+    row = cursor.fetchone()
+    if not row or row[0] != 'r':
+        return
+
+    logger.info(f"Converting {table} to a monthly partitioned table.")
+    legacy = f"{table}_legacy"
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    create_log_table(cursor, table)
+
+    cursor.execute(f'SELECT min(timestamp) FROM {legacy}')
+    first = cursor.fetchone()[0]
+    ensure_log_partitions(cursor, table, month_start(first) if first else None)
+
+    cursor.execute(
+        'SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position',
+        (table,)
     )
+    columns = ', '.join(name for (name,) in cursor.fetchall())
+    cursor.execute(f'UPDATE {legacy} SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL')
+    cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {legacy}')
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table}")
+    cursor.execute(f'DROP TABLE {legacy}')
+
+def write_archive(cursor, query, path):
+    # Written under a temporary name and fsynced, so a file at `path` is always complete
+    partial_path = path + '.partial'
+    try:
+        with open(partial_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                cursor.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)', f)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+def archive_default_partition(conn, cursor, table, cutoff):
+    """Archive and delete expired rows that landed in the table's default partition."""
+    default = f"{table}_default"
+    cursor.execute(f'SELECT count(*) FROM {default} WHERE timestamp < %s', (cutoff,))
+    expired = cursor.fetchone()[0]
+    if not expired:
+        conn.commit()
+        return None
+
+    logger.warning(f"{default} holds {expired} rows older than {cutoff:%Y-%m}; archiving them.")
+    path = os.path.join(LOG_ARCHIVE_DIR, f"{default}_before{cutoff:%Y%m}_{datetime.datetime.now():%Y%m%d%H%M%S}.csv.gz")
+    try:
+        # Block writes to the default partition only, so COPY and DELETE see the same rows
+        cursor.execute("SET LOCAL lock_timeout = '5s'")
+        cursor.execute(f'LOCK TABLE {default} IN SHARE ROW EXCLUSIVE MODE')
+        query = cursor.mogrify(f'SELECT * FROM {default} WHERE timestamp < %s', (cutoff,)).decode()
+        write_archive(cursor, query, path)
+        cursor.execute(f'DELETE FROM {default} WHERE timestamp < %s', (cutoff,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
+
+def archive_old_partitions(conn):
+    """Stream partitions past the retention window to gzipped CSV files, then detach and drop them."""
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    cutoff = month_start(datetime.datetime.now(), -LOG_RETENTION_MONTHS)
+    cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    archived = []
+
+    for table in LOG_TABLES:
+        for name, start in list_log_partitions(cursor, table):
+            if start >= cutoff:
+                continue
+
+            # COPY only needs a share lock on the partition, so the parent stays
+            # writable while the month is exported
+            path = os.path.join(LOG_ARCHIVE_DIR, f"{name}.csv.gz")
+            try:
+                write_archive(cursor, f'SELECT * FROM {name}', path)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            # DETACH locks the parent exclusively, so keep this transaction short
+            # and give up instead of queueing behind long-running readers
+            try:
+                cursor.execute("SET LOCAL lock_timeout = '5s'")
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEMA_LOCK_ID,))
+                cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+                conn.commit()
+            except psycopg2.errors.LockNotAvailable as e:
+                conn.rollback()
+                raise RuntimeError(
+                    f"Archived {path} but could not detach {name}: {table} is busy. "
+                    "The next run will retry."
+                ) from e
+            except Exception:
+                conn.rollback()
+                raise
+            archived.append(path)
+
+        default_path = archive_default_partition(conn, cursor, table, cutoff)
+        if default_path:
+            archived.append(default_path)
+
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEMA_LOCK_ID,))
+        ensure_log_partitions(cursor, table)
+        conn.commit()
+
+    return archived
+
+def migrate_food_logs_to_catalog(cursor):
+    # Older databases stored free-text food_name on every food_logs row
+    cursor.execute('''
+    SELECT 1 FROM information_schema.columns
+    WHERE table_name = 'food_logs' AND column_name = 'food_name'
     ''')
+    if not cursor.fetchone():
+        return
 
-    conn.commit()
-    conn.close()
+    logger.info("Migrating food_logs.food_name to the foods catalog.")
+    normalized = "lower(btrim(regexp_replace(food_name, '\\s+', ' ', 'g')))"
+    cursor.execute('ALTER TABLE food_logs ADD COLUMN IF NOT EXISTS food_id INTEGER REFERENCES foods (id)')
+    cursor.execute(f'''
+    INSERT INTO foods (name, display_name)
+    SELECT {normalized}, min(btrim(regexp_replace(food_name, '\\s+', ' ', 'g'))) FROM food_logs GROUP BY 1
+    ON CONFLICT (name) DO NOTHING
+    ''')
+    cursor.execute(f'''
+    UPDATE food_logs SET food_id = foods.id
+    FROM foods WHERE foods.name = {normalized} AND food_logs.food_id IS NULL
+    ''')
+    cursor.execute('ALTER TABLE food_logs ALTER COLUMN food_id SET NOT NULL')
+    cursor.execute('ALTER TABLE food_logs DROP COLUMN food_name')
 
-def get_db_connection():
-    database_url = get_database_url()
-    if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+# Read replicas
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', 5))
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get('REPLICA_CONNECT_TIMEOUT', 2))
+
+class ReplicaSet:
+    """Round-robins read connections over replicas, skipping ones that are down or lagging.
 
-    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    Health is tracked per worker: a replica that fails to connect or lags by
+    more than max_lag is skipped for retry_seconds, and lag is re-checked at
+    most every check_seconds.
+    """
+
+    def __init__(self, urls, max_lag, check_seconds, retry_seconds):
+        self.urls = urls
+        self.max_lag = max_lag
+        self.check_seconds = check_seconds
+        self.retry_seconds = retry_seconds
+        self.checked_until = {url: 0.0 for url in urls}
+        self.down_until = {url: 0.0 for url in urls}
+        self.next_index = 0
+        self.lock = threading.Lock()
+
+    def mark_down(self, url, reason):
+        self.down_until[url] = time.monotonic() + self.retry_seconds
+        logger.warning(f"Replica {self.urls.index(url)} unavailable, using primary: {reason}")
+
+    def replication_lag(self, conn):
+        """Replay lag in seconds, or None when the replica is not streaming from the primary.
+
+        receive_lsn = replay_lsn only means "caught up" while the WAL receiver is
+        streaming; a disconnected replica also ends up there once it replays
+        what it already has.
+        """
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END AS lag
+        ''')
+        lag = cursor.fetchone()['lag']
+        cursor.close()
+        return None if lag is None else float(lag)
+
+    def connect(self):
+        for _ in range(len(self.urls)):
+            with self.lock:
+                url = self.urls[self.next_index % len(self.urls)]
+                self.next_index += 1
+
+            now = time.monotonic()
+            if self.down_until[url] > now:
+                continue
+
+            try:
+                conn = psycopg2.connect(url, cursor_factory=RealDictCursor, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+            except psycopg2.OperationalError as e:
+                self.mark_down(url, str(e).strip())
+                continue
+
+            if self.checked_until[url] <= now:
+                try:
+                    lag = self.replication_lag(conn)
+                except psycopg2.Error as e:
+                    conn.close()
+                    self.mark_down(url, str(e).strip())
+                    continue
+                if lag is None:
+                    conn.close()
+                    self.mark_down(url, "WAL receiver is not streaming")
+                    continue
+                if lag > self.max_lag:
+                    conn.close()
+                    self.mark_down(url, f"replication lag {lag:.1f}s")
+                    continue
+                self.checked_until[url] = now + self.check_seconds
+
+            return conn
+
+        return None
+
+    def status(self):
+        now = time.monotonic()
+        return ["down" if self.down_until[url] > now else "ok" for url in self.urls]
+
+replica_set = ReplicaSet(get_replica_urls(), REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_SECONDS, REPLICA_RETRY_SECONDS)
+
+def mark_session_write():
+    # Stored in the session cookie so stickiness holds across workers
+    session['last_write_at'] = time.time()
+
+def session_wrote_recently():
+    last_write_at = session.get('last_write_at') if has_request_context() else None
+    return last_write_at is not None and time.time() - last_write_at < READ_YOUR_WRITES_SECONDS
+
+def get_db_connection(readonly=False):
+    if readonly and replica_set.urls and not session_wrote_recently():
+        conn = replica_set.connect()
+        if conn is not None:
+            return conn
+
+    conn = psycopg2.connect(normalize_database_url(get_database_url()), cursor_factory=RealDictCursor)
     return conn
 
+# Password hashing
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 8))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
+
+class ServiceOverloaded(Exception):
+    def __init__(self, retry_after=1):
+        super().__init__("Service overloaded")
+        self.retry_after = retry_after
+
+class PasswordHasher:
+    """Runs the password KDF on a small dedicated pool so it cannot take over request threads.
+
+    At most workers + queue_limit hashes are in flight per process; beyond
+    that, or if a hash waits longer than timeout, ServiceOverloaded is raised.
+    """
+
+    def __init__(self, method, workers, queue_limit, timeout):
+        self.method = method
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + queue_limit)
+        # werkzeug stores the full parameter set (e.g. "scrypt:32768:8:1") before the first '$'
+        self.method_prefix = generate_password_hash('', method=method).split('$', 1)[0]
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise ServiceOverloaded()
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Don't spend the pool on a hash nobody is waiting for; a hash that
+            # is already running cannot be stopped and finishes on its own
+            future.cancel()
+            raise ServiceOverloaded()
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self.run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method_prefix
+
+password_hasher = PasswordHasher(PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT, PASSWORD_HASH_TIMEOUT)
+
+# Admission control for /api/ routes
+ADMISSION_STORE_PATH = os.environ.get('ADMISSION_STORE_PATH', os.path.join(tempfile.gettempdir(), 'mood_bite_admission.sqlite3'))
+ADMISSION_MIN_CONCURRENCY = int(os.environ.get('ADMISSION_MIN_CONCURRENCY', 2))
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get('ADMISSION_MAX_CONCURRENCY', 8))
+ADMISSION_TARGET_P95_SECONDS = float(os.environ.get('ADMISSION_TARGET_P95_SECONDS', 0.5))
+ADMISSION_WINDOW = int(os.environ.get('ADMISSION_WINDOW', 50))
+ADMISSION_METRICS_FLUSH_SECONDS = 5
+# A worker whose metrics are this old is gone; its counters move into the retired totals
+ADMISSION_WORKER_STALE_SECONDS = 60
+ADMISSION_BUCKET_IDLE_SECONDS = 3600
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# endpoint -> (tokens refilled per second, bucket capacity), per user, shared by all workers
+RATE_LIMITS = {
+    'api_chat': (float(os.environ.get('CHAT_RATE_PER_MINUTE', 20)) / 60, int(os.environ.get('CHAT_BURST', 5))),
+    'api_trends': (1.0, 10)
+}
+
+# Same shape, but kept in each worker's memory: autocomplete fires per keystroke
+# and should not take the host-wide SQLite write lock
+LOCAL_RATE_LIMITS = {
+    'api_food_suggest': (10.0, 30)
+}
+
+class AdmissionStore:
+    """SQLite file shared by all workers on the host, holding token buckets and metrics snapshots."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.last_prune = 0.0
+
+    def connection(self):
+        # sqlite connections must not cross a fork or be shared between threads
+        if getattr(self.local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=0.1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS worker_metrics (
+                worker TEXT NOT NULL,
+                name TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                value REAL NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (worker, name, labels)
+            )
+            ''')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return self.local.conn
+
+    def take_token(self, key, rate, burst):
+        """Returns (allowed, retry_after_seconds)."""
+        now = time.time()
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+            if now - self.last_prune > ADMISSION_BUCKET_IDLE_SECONDS:
+                # An idle bucket is full again, which is the same as having no row
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - ADMISSION_BUCKET_IDLE_SECONDS,))
+                self.last_prune = now
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def write_metrics(self, worker, samples):
+        now = time.time()
+        stale_before = now - ADMISSION_WORKER_STALE_SECONDS
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO worker_metrics (worker, name, labels, value, updated) VALUES (?, ?, ?, ?, ?)',
+                [(worker, name, labels, value, now) for (name, labels), value in samples.items()]
+            )
+            # Fold counters of workers that stopped reporting into 'retired', so
+            # the exported sums never go down when a worker exits
+            conn.execute('''
+            INSERT INTO worker_metrics (worker, name, labels, value, updated)
+            SELECT 'retired', name, labels, sum(value), ? FROM worker_metrics
+            WHERE worker != 'retired' AND updated < ? AND name LIKE '%\\_total' ESCAPE '\\'
+            GROUP BY name, labels
+            ON CONFLICT (worker, name, labels) DO UPDATE SET
+                value = value + excluded.value,
+                updated = excluded.updated
+            ''', (now, stale_before))
+            conn.execute("DELETE FROM worker_metrics WHERE worker != 'retired' AND updated < ?", (stale_before,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def read_metrics(self):
+        return self.connection().execute(
+            'SELECT worker, name, labels, value FROM worker_metrics ORDER BY name, labels, worker'
+        ).fetchall()
+
+class LocalTokenBuckets:
+    """In-process token buckets for endpoints that are too chatty for the shared store."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.last_prune = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take_token(self, key, rate, burst):
+        """Returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if now - self.last_prune > ADMISSION_BUCKET_IDLE_SECONDS:
+                idle_before = now - ADMISSION_BUCKET_IDLE_SECONDS
+                self.buckets = {k: v for k, v in self.buckets.items() if v[1] >= idle_before}
+                self.last_prune = now
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+class AdaptiveConcurrencyLimiter:
+    """Per-worker cap on in-flight API requests, tuned from observed p95 latency.
+
+    After every `window` completed requests the limit grows by one while p95
+    stays under target, and shrinks by 10% when it goes over.
+    """
+
+    def __init__(self, minimum, maximum, target_p95, window):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_p95 = target_p95
+        self.window = window
+        self.limit = float(maximum)
+        self.inflight = 0
+        self.latencies = []
+        self.last_p95 = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.inflight >= int(self.limit):
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self, elapsed=None):
+        with self.lock:
+            self.inflight -= 1
+            if elapsed is None:
+                return
+            self.latencies.append(elapsed)
+            if len(self.latencies) < self.window:
+                return
+            self.latencies.sort()
+            self.last_p95 = self.latencies[math.ceil(len(self.latencies) * 0.95) - 1]
+            if self.last_p95 > self.target_p95:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1)
+            self.latencies = []
+
+admission_store = AdmissionStore(ADMISSION_STORE_PATH)
+local_buckets = LocalTokenBuckets()
+concurrency_limiter = AdaptiveConcurrencyLimiter(
+    ADMISSION_MIN_CONCURRENCY, ADMISSION_MAX_CONCURRENCY, ADMISSION_TARGET_P95_SECONDS, ADMISSION_WINDOW
+)
+admission_decisions = defaultdict(int)
+admission_flusher_pid = None
+admission_worker_id = None
+admission_lock = threading.Lock()
+
+def record_admission(endpoint, decision):
+    with admission_lock:
+        admission_decisions[(endpoint, decision)] += 1
+
+def admission_worker():
+    # pid alone is not unique: gunicorn can reuse it for a replacement worker
+    global admission_worker_id
+    if admission_worker_id is None or not admission_worker_id.startswith(f"{os.getpid()}-"):
+        admission_worker_id = f"{os.getpid()}-{int(time.time() * 1000)}"
+    return admission_worker_id
+
+def flush_admission_metrics():
+    with admission_lock:
+        samples = {
+            ('mood_bite_admission_decisions_total', f'endpoint="{endpoint}",decision="{decision}"'): count
+            for (endpoint, decision), count in admission_decisions.items()
+        }
+    samples[('mood_bite_admission_concurrency_limit', '')] = int(concurrency_limiter.limit)
+    samples[('mood_bite_admission_inflight', '')] = concurrency_limiter.inflight
+    samples[('mood_bite_admission_p95_seconds', '')] = concurrency_limiter.last_p95
+    try:
+        admission_store.write_metrics(admission_worker(), samples)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not write admission metrics: {str(e)}")
+
+def flush_admission_metrics_forever():
+    while True:
+        time.sleep(ADMISSION_METRICS_FLUSH_SECONDS)
+        flush_admission_metrics()
+
+def start_admission_metrics_flusher():
+    # Threads do not survive a fork, so each worker process starts its own flusher
+    global admission_flusher_pid
+    with admission_lock:
+        if admission_flusher_pid == os.getpid():
+            return
+        admission_flusher_pid = os.getpid()
+    threading.Thread(target=flush_admission_metrics_forever, name='admission-metrics', daemon=True).start()
+
+def render_admission_metrics():
+    lines = []
+    totals = defaultdict(float)
+    for worker, name, labels, value in admission_store.read_metrics():
+        if name.endswith('_total'):
+            # Live workers plus the retired totals of workers that have exited
+            totals[(name, labels)] += value
+        else:
+            worker_label = f'worker="{worker}"' + (f',{labels}' if labels else '')
+            lines.append(f"{name}{{{worker_label}}} {value:g}")
+    for (name, labels), value in sorted(totals.items()):
+        lines.append(f"{name}{{{labels}}} {value:g}")
+    return '\n'.join(lines) + '\n'
+
+# Food catalog
+FOOD_SUGGEST_LIMIT = 10
+FOOD_INDEX_REFRESH_SECONDS = int(os.environ.get('FOOD_INDEX_REFRESH_SECONDS', 30))
+
+# Set by init_db once the pg_trgm extension and index are in place
+trigram_available = False
+
+def normalize_food_name(food_name):
+    return ' '.join(food_name.split()).lower()
+
+def get_or_create_food(cursor, food_name):
+    """Returns (id, display_name) of the catalog entry, creating it on first use."""
+    display_name = ' '.join(food_name.split())
+    cursor.execute(
+        '''INSERT INTO foods (name, display_name) VALUES (%s, %s)
+        ON CONFLICT (name) DO NOTHING
+        RETURNING id, display_name''',
+        (normalize_food_name(food_name), display_name)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute('SELECT id, display_name FROM foods WHERE name = %s', (normalize_food_name(food_name),))
+        row = cursor.fetchone()
+    return row['id'], row['display_name']
+
+class FoodIndex:
+    """Per-worker sorted array of (normalized name, id, display name) for prefix lookups.
+
+    Writers build a new list and swap it in, so readers never need the lock.
+    A background thread pulls new rows incrementally by id, so a refresh only
+    reads foods created since the last one.
+    """
+
+    def __init__(self, refresh_seconds):
+        self.refresh_seconds = refresh_seconds
+        self.entries = []
+        self.last_id = 0
+        self.lock = threading.Lock()
+        self.refresher_pid = None
+
+    def add_many(self, rows):
+        with self.lock:
+            merged = {name: (name, food_id, display_name) for food_id, name, display_name in rows}
+            merged.update((entry[0], entry) for entry in self.entries)
+            self.entries = sorted(merged.values())
+
+    def add(self, food_id, name, display_name):
+        # Called on the request path, so avoid rebuilding the list when the food is known
+        entry = (name, food_id, display_name)
+        with self.lock:
+            position = bisect.bisect_left(self.entries, (name,))
+            if position < len(self.entries) and self.entries[position][0] == name:
+                return
+            entries = list(self.entries)
+            entries.insert(position, entry)
+            self.entries = entries
+
+    def refresh(self):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT id, name, display_name FROM foods WHERE id > %s ORDER BY id',
+                (self.last_id,)
+            )
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        if rows:
+            self.add_many([(row['id'], row['name'], row['display_name']) for row in rows])
+            self.last_id = rows[-1]['id']
+
+    def refresh_forever(self):
+        while True:
+            try:
+                self.refresh()
+            except psycopg2.Error as e:
+                # Keep serving the last snapshot and retry after another interval
+                logger.error(f"Error refreshing food index: {str(e)}")
+            time.sleep(self.refresh_seconds)
+
+    def start(self):
+        # Threads do not survive a fork, so each worker process starts its own refresher
+        with self.lock:
+            if self.refresher_pid == os.getpid():
+                return
+            self.refresher_pid = os.getpid()
+        threading.Thread(target=self.refresh_forever, name='food-index-refresh', daemon=True).start()
+
+    def suggest(self, prefix, limit):
+        entries = self.entries
+        position = bisect.bisect_left(entries, (prefix,))
+        suggestions = []
+        while position < len(entries) and len(suggestions) < limit and entries[position][0].startswith(prefix):
+            _, food_id, display_name = entries[position]
+            suggestions.append({"id": food_id, "name": display_name})
+            position += 1
+        return suggestions
+
+food_index = FoodIndex(FOOD_INDEX_REFRESH_SECONDS)
+
+def fuzzy_food_suggestions(query, limit):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            '''SELECT id, display_name FROM foods
+            WHERE name %% %s
+            ORDER BY similarity(name, %s) DESC, name
+            LIMIT %s''',
+            (query, query, limit)
+        )
+        return [{"id": row['id'], "name": row['display_name']} for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+# Mood trend rollups
+ROLLUP_TABLES = {
+    'day': 'mood_rollups_daily',
+    'week': 'mood_rollups_weekly'
+}
+ROLLUP_DEFAULT_BUCKETS = {'day': 30, 'week': 12}
+ROLLUP_MAX_BUCKETS = 366
+
+def rollup_bucket(granularity, day):
+    # Weeks start on Monday, matching date_trunc('week', ...) in Postgres
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+def rollup_step(granularity):
+    return datetime.timedelta(days=7 if granularity == 'week' else 1)
+
+def create_rollup_tables(cursor):
+    for table in ROLLUP_TABLES.values():
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id INTEGER NOT NULL,
+            bucket DATE NOT NULL,
+            mood_entries INTEGER NOT NULL DEFAULT 0,
+            intensity_total INTEGER NOT NULL DEFAULT 0,
+            food_entries INTEGER NOT NULL DEFAULT 0,
+            calories_total BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, bucket),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+        # One counter column per mood, so moods added to MOOD_EMOJIS get a column on next startup
+        for mood in MOOD_EMOJIS:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {mood}_count INTEGER NOT NULL DEFAULT 0')
+
+def record_mood_rollup(cursor, user_id, timestamp, mood, intensity):
+    count_column = f", {mood}_count" if mood in MOOD_EMOJIS else ''
+    count_value = ', 1' if mood in MOOD_EMOJIS else ''
+    count_update = f",\n            {mood}_count = r.{mood}_count + 1" if mood in MOOD_EMOJIS else ''
+
+    for granularity, table in ROLLUP_TABLES.items():
+        cursor.execute(f'''
+        INSERT INTO {table} AS r (user_id, bucket, mood_entries, intensity_total{count_column})
+        VALUES (%s, %s, 1, %s{count_value})
+        ON CONFLICT (user_id, bucket) DO UPDATE SET
+            mood_entries = r.mood_entries + 1,
+            intensity_total = r.intensity_total + EXCLUDED.intensity_total{count_update}
+        ''', (user_id, rollup_bucket(granularity, timestamp.date()), intensity))
+
+def record_food_rollup(cursor, user_id, timestamp, calories):
+    for granularity, table in ROLLUP_TABLES.items():
+        cursor.execute(f'''
+        INSERT INTO {table} AS r (user_id, bucket, food_entries, calories_total)
+        VALUES (%s, %s, 1, %s)
+        ON CONFLICT (user_id, bucket) DO UPDATE SET
+            food_entries = r.food_entries + 1,
+            calories_total = r.calories_total + EXCLUDED.calories_total
+        ''', (user_id, rollup_bucket(granularity, timestamp.date()), calories or 0))
+
+def backfill_rollups(conn, since):
+    """Rebuild rollup buckets starting at `since` from the raw log tables."""
+    cursor = conn.cursor()
+    mood_columns = ', '.join(f"{mood}_count" for mood in MOOD_EMOJIS)
+    mood_counts = ', '.join(f"count(*) FILTER (WHERE mood = '{mood}')" for mood in MOOD_EMOJIS)
+
+    for granularity, table in ROLLUP_TABLES.items():
+        # Only rebuild whole weeks, the logs before `since` may already be archived
+        start = since
+        if granularity == 'week':
+            start = since + datetime.timedelta(days=(7 - since.weekday()) % 7)
+
+        cursor.execute(f'DELETE FROM {table} WHERE bucket >= %s', (start,))
+        cursor.execute(f'''
+        INSERT INTO {table} (user_id, bucket, {mood_columns}, mood_entries, intensity_total)
+        SELECT user_id, date_trunc('{granularity}', timestamp)::date, {mood_counts}, count(*), sum(intensity)
+        FROM mood_logs WHERE timestamp >= %s
+        GROUP BY 1, 2
+        ''', (start,))
+        cursor.execute(f'''
+        INSERT INTO {table} AS r (user_id, bucket, food_entries, calories_total)
+        SELECT user_id, date_trunc('{granularity}', timestamp)::date, count(*), coalesce(sum(calories), 0)
+        FROM food_logs WHERE timestamp >= %s
+        GROUP BY 1, 2
+        ON CONFLICT (user_id, bucket) DO UPDATE SET
+            food_entries = EXCLUDED.food_entries,
+            calories_total = EXCLUDED.calories_total
+        ''', (start,))
+
+    conn.commit()
+
+def serialize_rollup(bucket, row):
+    mood_entries = row['mood_entries'] if row else 0
+    return {
+        "bucket": bucket.isoformat(),
+        "moods": {mood: (row[f"{mood}_count"] if row else 0) for mood in MOOD_EMOJIS},
+        "mood_entries": mood_entries,
+        "mean_intensity": round(row['intensity_total'] / mood_entries, 2) if mood_entries else None,
+        "food_entries": row['food_entries'] if row else 0,
+        "calories": row['calories_total'] if row else 0
+    }
+
 # AI functions using TextBlob
 def detect_mood_from_text(text):
     try:
@@ -512,34 +1538,44 @@ def generate_chat_response(user_message, detected_mood):
 
 # Utility functions
 def generate_food_mood_insights(user_id):
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
+    cursor = conn.cursor()
+    cutoff = recent_log_cutoff()
     
-    food_logs = conn.execute(
-        'SELECT * FROM food_logs WHERE user_id = ? ORDER BY timestamp DESC LIMIT 20',
-        (user_id,)
-    ).fetchall()
+    cursor.execute(
+        '''SELECT food_logs.*, foods.display_name AS food_name
+        FROM food_logs JOIN foods ON foods.id = food_logs.food_id
+        WHERE user_id = %s AND timestamp >= %s ORDER BY timestamp DESC LIMIT 20''',
+        (user_id, cutoff)
+    )
+    food_logs = cursor.fetchall()
     
-    mood_logs = conn.execute(
-        'SELECT * FROM mood_logs WHERE user_id = ? ORDER BY timestamp DESC LIMIT 20',
-        (user_id,)
-    ).fetchall()
+    cursor.execute(
+        'SELECT * FROM mood_logs WHERE user_id = %s AND timestamp >= %s ORDER BY timestamp DESC LIMIT 20',
+        (user_id, cutoff)
+    )
+    mood_logs = cursor.fetchall()
     
+    # Group by catalog id so spelling/case variants of a food are counted together
     food_mood_map = defaultdict(list)
+    food_names = {}
     
     for food in food_logs:
-        food_time = datetime.datetime.strptime(food['timestamp'], '%Y-%m-%d %H:%M:%S')
+        food_time = food['timestamp']
+        food_names[food['food_id']] = food['food_name']
         
         for mood in mood_logs:
-            mood_time = datetime.datetime.strptime(mood['timestamp'], '%Y-%m-%d %H:%M:%S')
+            mood_time = mood['timestamp']
             time_diff = (mood_time - food_time).total_seconds() / 3600
             
             if 0 <= time_diff <= 2:
-                food_mood_map[food['food_name']].append((mood['mood'], mood['intensity']))
+                food_mood_map[food['food_id']].append((mood['mood'], mood['intensity']))
     
     insights = []
     
     if food_mood_map:
-        for food, moods in food_mood_map.items():
+        for food_id, moods in food_mood_map.items():
+            food = food_names[food_id]
             mood_counts = defaultdict(int)
             total_intensity = 0
             
@@ -572,12 +1608,113 @@ except Exception as e:
     logger.error(f"Failed to initialize database: {str(e)}")
     logger.error("App will continue but may not function properly without database.")
 
+# Warm the food autocomplete index in the background
+food_index.start()
+
+def upgrade_password_hash(user_id, password):
+    # Best effort: a busy pool or failed update just retries on the next login
+    try:
+        new_hash = password_hasher.hash(password)
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE users SET password = %s WHERE id = %s', (new_hash, user_id))
+            conn.commit()
+        finally:
+            conn.close()
+    except (ServiceOverloaded, psycopg2.Error) as e:
+        logger.warning(f"Could not upgrade password hash for user {user_id}: {str(e)}")
+
 # Routes
+@app.before_request
+def admit_api_request():
+    if not request.path.startswith('/api/'):
+        return None
+
+    start_admission_metrics_flusher()
+    endpoint = request.endpoint or 'unknown'
+    if not concurrency_limiter.acquire():
+        record_admission(endpoint, 'rejected_concurrency')
+        return jsonify({"error": "Server is busy, please try again shortly."}), 503, {'Retry-After': '1'}
+    g.admitted_at = time.monotonic()
+
+    client = session.get('user_id') or request.remote_addr
+    allowed = True
+    if endpoint in LOCAL_RATE_LIMITS:
+        allowed, retry_after = local_buckets.take_token(f"{endpoint}:{client}", *LOCAL_RATE_LIMITS[endpoint])
+    elif endpoint in RATE_LIMITS:
+        try:
+            allowed, retry_after = admission_store.take_token(f"{endpoint}:{client}", *RATE_LIMITS[endpoint])
+        except sqlite3.Error as e:
+            # Fail open: a contended or broken limiter store should not take the API down
+            logger.warning(f"Rate limiter unavailable: {str(e)}")
+            record_admission(endpoint, 'limiter_error')
+    if not allowed:
+        g.admission_rejected = True
+        record_admission(endpoint, 'rejected_rate_limit')
+        return jsonify({"error": "Too many requests"}), 429, {'Retry-After': str(math.ceil(retry_after))}
+
+    record_admission(endpoint, 'admitted')
+    return None
+
+@app.teardown_request
+def release_api_request(error=None):
+    admitted_at = g.pop('admitted_at', None)
+    if admitted_at is None:
+        return
+    # Rate limited requests say nothing about how loaded the worker is
+    elapsed = None if g.pop('admission_rejected', False) else time.monotonic() - admitted_at
+    concurrency_limiter.release(elapsed)
+
+@app.errorhandler(ServiceOverloaded)
+def service_overloaded(error):
+    return "Server is busy, please try again shortly.", 503, {'Retry-After': str(error.retry_after)}
+
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    encoding = choose_encoding()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=4))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=6))
+    else:
+        return response
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    encoding = choose_encoding()
+    suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding)
+    mimetype = mimetypes.guess_type(filename)[0]
+
+    if suffix and os.path.isfile(os.path.join(ASSETS_DIR, filename + suffix)):
+        response = send_from_directory(ASSETS_DIR, filename + suffix, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(ASSETS_DIR, filename, mimetype=mimetype)
+
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+    return response
+
 @app.route('/')
 def index():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
-    return render_template_string(INDEX_TEMPLATE)
+    return render_page(INDEX_TEMPLATE)
 
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
@@ -587,27 +1724,29 @@ def signup():
         password = request.form['password']
 
         if not username or not email or not password:
-            return Template(SIGNUP_TEMPLATE).render(error="All fields are required")
+            return render_page(SIGNUP_TEMPLATE, error="All fields are required")
 
         if len(password) < 6:
-            return Template(SIGNUP_TEMPLATE).render(error="Password must be at least 6 characters")
+            return render_page(SIGNUP_TEMPLATE, error="Password must be at least 6 characters")
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = password_hasher.hash(password)
 
         conn = get_db_connection()
         try:
-            conn.execute(
-                'INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO users (username, email, password) VALUES (%s, %s, %s)',
                 (username, email, hashed_password)
             )
             conn.commit()
             conn.close()
+            mark_session_write()
             return redirect(url_for('login'))
         except psycopg2.IntegrityError:
             conn.close()
-            return Template(SIGNUP_TEMPLATE).render(error="Username or email already exists")
+            return render_page(SIGNUP_TEMPLATE, error="Username or email already exists")
 
-    return Template(SIGNUP_TEMPLATE).render(error=None)
+    return render_page(SIGNUP_TEMPLATE, error=None)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -616,20 +1755,24 @@ def login():
         password = request.form['password']
 
         conn = get_db_connection()
-        user = conn.execute(
-            'SELECT * FROM users WHERE username = ?',
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT * FROM users WHERE username = %s',
             (username,)
-        ).fetchone()
+        )
+        user = cursor.fetchone()
         conn.close()
 
-        if user and check_password_hash(user['password'], password):
+        if user and password_hasher.verify(user['password'], password):
+            if password_hasher.needs_rehash(user['password']):
+                upgrade_password_hash(user['id'], password)
             session['user_id'] = user['id']
             session['username'] = user['username']
             return redirect(url_for('dashboard'))
         else:
-            return Template(LOGIN_TEMPLATE).render(error="Invalid username or password")
+            return render_page(LOGIN_TEMPLATE, error="Invalid username or password")
 
-    return Template(LOGIN_TEMPLATE).render(error=None)
+    return render_page(LOGIN_TEMPLATE, error=None)
 
 @app.route('/logout')
 def logout():
@@ -642,23 +1785,29 @@ def dashboard():
         return redirect(url_for('login'))
     
     user_id = session['user_id']
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
+    cursor = conn.cursor()
+    cutoff = recent_log_cutoff()
     
-    recent_foods = conn.execute(
-        'SELECT * FROM food_logs WHERE user_id = ? ORDER BY timestamp DESC LIMIT 5',
-        (user_id,)
-    ).fetchall()
+    cursor.execute(
+        '''SELECT food_logs.*, foods.display_name AS food_name
+        FROM food_logs JOIN foods ON foods.id = food_logs.food_id
+        WHERE user_id = %s AND timestamp >= %s ORDER BY timestamp DESC LIMIT 5''',
+        (user_id, cutoff)
+    )
+    recent_foods = cursor.fetchall()
     
-    recent_moods = conn.execute(
-        'SELECT * FROM mood_logs WHERE user_id = ? ORDER BY timestamp DESC LIMIT 5',
-        (user_id,)
-    ).fetchall()
+    cursor.execute(
+        'SELECT * FROM mood_logs WHERE user_id = %s AND timestamp >= %s ORDER BY timestamp DESC LIMIT 5',
+        (user_id, cutoff)
+    )
+    recent_moods = cursor.fetchall()
     
     insights = generate_food_mood_insights(user_id)
     
     conn.close()
     
-    return Template(DASHBOARD_TEMPLATE).render(
+    return render_page(DASHBOARD_TEMPLATE,
         username=session['username'],
         recent_foods=recent_foods,
         recent_moods=recent_moods,
@@ -675,28 +1824,55 @@ def log_food():
         food_name = request.form['food_name']
         calories = request.form.get('calories')
         
-        if not food_name:
-            return Template(LOG_FOOD_TEMPLATE).render(username=session['username'], error="Food name is required")
+        if not normalize_food_name(food_name):
+            return render_page(LOG_FOOD_TEMPLATE, username=session['username'], error="Food name is required")
 
         if calories:
             try:
                 calories = int(calories)
             except ValueError:
-                return Template(LOG_FOOD_TEMPLATE).render(username=session['username'], error="Calories must be a number")
+                return render_page(LOG_FOOD_TEMPLATE, username=session['username'], error="Calories must be a number")
         else:
             calories = None
 
+        ensure_current_partitions()
         conn = get_db_connection()
-        conn.execute(
-            'INSERT INTO food_logs (user_id, food_name, calories) VALUES (?, ?, ?)',
-            (session['user_id'], food_name, calories)
+        cursor = conn.cursor()
+        food_id, display_name = get_or_create_food(cursor, food_name)
+        cursor.execute(
+            'INSERT INTO food_logs (user_id, food_id, calories) VALUES (%s, %s, %s) RETURNING timestamp',
+            (session['user_id'], food_id, calories)
         )
+        record_food_rollup(cursor, session['user_id'], cursor.fetchone()['timestamp'], calories)
         conn.commit()
         conn.close()
+        mark_session_write()
+
+        food_index.add(food_id, normalize_food_name(food_name), display_name)
 
         return redirect(url_for('dashboard'))
 
-    return Template(LOG_FOOD_TEMPLATE).render(username=session['username'], error=None)
+    return render_page(LOG_FOOD_TEMPLATE, username=session['username'], error=None)
+
+@app.route('/api/foods/suggest')
+def api_food_suggest():
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    query = normalize_food_name(request.args.get('q', ''))
+    if not query:
+        return jsonify({"suggestions": []})
+
+    food_index.start()
+    suggestions = food_index.suggest(query, FOOD_SUGGEST_LIMIT)
+
+    if not suggestions and trigram_available and len(query) >= 3:
+        try:
+            suggestions = fuzzy_food_suggestions(query, FOOD_SUGGEST_LIMIT)
+        except psycopg2.Error as e:
+            logger.error(f"Error in fuzzy food suggestions: {str(e)}")
+
+    return jsonify({"suggestions": suggestions})
 
 @app.route('/log_mood', methods=['GET', 'POST'])
 def log_mood():
@@ -708,42 +1884,93 @@ def log_mood():
         intensity = request.form['intensity']
         
         if not mood or not intensity:
-            return Template(LOG_MOOD_TEMPLATE).render(username=session['username'], moods=MOOD_EMOJIS.keys(), mood_emojis=MOOD_EMOJIS, error="All fields are required")
+            return render_page(LOG_MOOD_TEMPLATE, username=session['username'], moods=MOOD_EMOJIS.keys(), mood_emojis=MOOD_EMOJIS, error="All fields are required")
 
         try:
             intensity = int(intensity)
             if intensity < 1 or intensity > 5:
-                return Template(LOG_MOOD_TEMPLATE).render(username=session['username'], moods=MOOD_EMOJIS.keys(), mood_emojis=MOOD_EMOJIS, error="Intensity must be between 1 and 5")
+                return render_page(LOG_MOOD_TEMPLATE, username=session['username'], moods=MOOD_EMOJIS.keys(), mood_emojis=MOOD_EMOJIS, error="Intensity must be between 1 and 5")
         except ValueError:
-            return Template(LOG_MOOD_TEMPLATE).render(username=session['username'], moods=MOOD_EMOJIS.keys(), mood_emojis=MOOD_EMOJIS, error="Intensity must be a number")
+            return render_page(LOG_MOOD_TEMPLATE, username=session['username'], moods=MOOD_EMOJIS.keys(), mood_emojis=MOOD_EMOJIS, error="Intensity must be a number")
 
+        ensure_current_partitions()
         conn = get_db_connection()
-        conn.execute(
-            'INSERT INTO mood_logs (user_id, mood, intensity) VALUES (?, ?, ?)',
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO mood_logs (user_id, mood, intensity) VALUES (%s, %s, %s) RETURNING timestamp',
             (session['user_id'], mood, intensity)
         )
+        record_mood_rollup(cursor, session['user_id'], cursor.fetchone()['timestamp'], mood, intensity)
         conn.commit()
         conn.close()
+        mark_session_write()
 
         return redirect(url_for('dashboard'))
 
-    return Template(LOG_MOOD_TEMPLATE).render(username=session['username'], moods=MOOD_EMOJIS.keys(), mood_emojis=MOOD_EMOJIS, error=None)
+    return render_page(LOG_MOOD_TEMPLATE, username=session['username'], moods=MOOD_EMOJIS.keys(), mood_emojis=MOOD_EMOJIS, error=None)
+
+@app.route('/api/trends')
+def api_trends():
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ROLLUP_TABLES:
+        return jsonify({"error": "granularity must be 'day' or 'week'"}), 400
+
+    step = rollup_step(granularity)
+    try:
+        end = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.date.today()
+        if request.args.get('from'):
+            start = datetime.date.fromisoformat(request.args['from'])
+        else:
+            start = end - step * (ROLLUP_DEFAULT_BUCKETS[granularity] - 1)
+    except ValueError:
+        return jsonify({"error": "from and to must be dates in YYYY-MM-DD format"}), 400
+
+    start = rollup_bucket(granularity, start)
+    end = rollup_bucket(granularity, end)
+    bucket_count = (end - start) // step + 1
+    if bucket_count < 1:
+        return jsonify({"error": "from must not be after to"}), 400
+    if bucket_count > ROLLUP_MAX_BUCKETS:
+        return jsonify({"error": f"At most {ROLLUP_MAX_BUCKETS} buckets can be requested"}), 400
+
+    conn = get_db_connection(readonly=True)
+    cursor = conn.cursor()
+    cursor.execute(
+        f'SELECT * FROM {ROLLUP_TABLES[granularity]} WHERE user_id = %s AND bucket BETWEEN %s AND %s',
+        (session['user_id'], start, end)
+    )
+    rows = {row['bucket']: row for row in cursor.fetchall()}
+    conn.close()
+
+    buckets = [serialize_rollup(start + step * i, rows.get(start + step * i)) for i in range(bucket_count)]
+
+    return jsonify({
+        "granularity": granularity,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "buckets": buckets
+    })
 
 @app.route('/chat')
 def chat():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    chat_history = conn.execute(
-        'SELECT * FROM chat_logs WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10',
-        (session['user_id'],)
-    ).fetchall()
+    conn = get_db_connection(readonly=True)
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT * FROM chat_logs WHERE user_id = %s AND timestamp >= %s ORDER BY timestamp DESC LIMIT 10',
+        (session['user_id'], recent_log_cutoff())
+    )
+    chat_history = cursor.fetchall()
     conn.close()
     
     chat_history = list(reversed(chat_history))
     
-    return Template(CHAT_TEMPLATE).render(
+    return render_page(CHAT_TEMPLATE,
         username=session['username'],
         chat_history=chat_history,
         mood_emojis=MOOD_EMOJIS
@@ -762,13 +1989,16 @@ def api_chat():
         detected_mood = detect_mood_from_text(user_message)
         response = generate_chat_response(user_message, detected_mood)
         
+        ensure_current_partitions()
         conn = get_db_connection()
-        conn.execute(
-            'INSERT INTO chat_logs (user_id, message, response, detected_mood) VALUES (?, ?, ?, ?)',
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO chat_logs (user_id, message, response, detected_mood) VALUES (%s, %s, %s, %s)',
             (session['user_id'], user_message, response, detected_mood)
         )
         conn.commit()
         conn.close()
+        mark_session_write()
         
         return jsonify({
             "response": response,
@@ -791,7 +2021,7 @@ def insights():
     user_id = session['user_id']
     insights = generate_food_mood_insights(user_id)
     
-    return Template(INSIGHTS_TEMPLATE).render(
+    return render_page(INSIGHTS_TEMPLATE,
         username=session['username'],
         insights=insights
     )
@@ -814,8 +2044,57 @@ def health_check():
         status["database"] = f"error: {str(e)}"
         status["status"] = "degraded"
     
+    if replica_set.urls:
+        status["replicas"] = replica_set.status()
+    
     return jsonify(status)
 
+@app.route('/metrics')
+def metrics():
+    # Disabled unless METRICS_TOKEN is set; scrapers send it as a bearer token
+    if not METRICS_TOKEN:
+        return "Not Found\n", 404, {'Content-Type': 'text/plain; charset=utf-8'}
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+        return "Unauthorized\n", 401, {'Content-Type': 'text/plain; charset=utf-8', 'WWW-Authenticate': 'Bearer'}
+
+    flush_admission_metrics()
+    try:
+        body = render_admission_metrics()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading admission metrics: {str(e)}")
+        return "metrics unavailable\n", 503, {'Content-Type': 'text/plain; charset=utf-8'}
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Vendor static assets and write fingerprinted, precompressed copies."""
+    manifest = build_assets()
+    for name, fingerprinted in manifest.items():
+        print(f"{name} -> {fingerprinted}")
+
+@app.cli.command('backfill-rollups')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First day to rebuild (default: start of the log retention window).')
+def backfill_rollups_command(since):
+    """Rebuild the daily and weekly mood rollups from the raw logs."""
+    since = since.date() if since else month_start(datetime.datetime.now(), -LOG_RETENTION_MONTHS).date()
+    conn = get_db_connection()
+    try:
+        backfill_rollups(conn, since)
+    finally:
+        conn.close()
+    print(f"Rebuilt rollups since {since.isoformat()}")
+
+@app.cli.command('archive-logs')
+def archive_logs_command():
+    """Archive log partitions older than LOG_RETENTION_MONTHS and create upcoming ones."""
+    conn = get_db_connection()
+    try:
+        for path in archive_old_partitions(conn):
+            print(f"Archived {path}")
+    finally:
+        conn.close()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,111 @@
+"""Login throughput and cheap-route latency under a password hashing storm.
+
+Run against a live server, e.g.:
+
+    gunicorn app:app --worker-class gthread --threads 8 &
+    python bench_password_hashing.py
+
+Signs up a benchmark user, then hammers /login from --login-clients threads
+while --probe-clients threads request / (no DB, no hashing). Compare runs
+with different PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE_LIMIT settings.
+"""
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+opener = urllib.request.build_opener(NoRedirect)
+
+
+def post_form(url, fields):
+    data = urllib.parse.urlencode(fields).encode()
+    try:
+        with opener.open(url, data=data, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def get(url):
+    try:
+        with opener.open(url, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--login-clients', type=int, default=32)
+    parser.add_argument('--probe-clients', type=int, default=4)
+    parser.add_argument('--username', default='bench_user')
+    parser.add_argument('--password', default='bench_password')
+    args = parser.parse_args()
+
+    post_form(f"{args.url}/signup", {
+        'username': args.username,
+        'email': f"{args.username}@example.com",
+        'password': args.password
+    })
+
+    deadline = time.monotonic() + args.duration
+    lock = threading.Lock()
+    login_statuses = {}
+    login_latencies = []
+    probe_latencies = []
+
+    def login_client():
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            status = post_form(f"{args.url}/login", {'username': args.username, 'password': args.password})
+            elapsed = time.monotonic() - start
+            with lock:
+                login_statuses[status] = login_statuses.get(status, 0) + 1
+                if status == 302:
+                    login_latencies.append(elapsed)
+
+    def probe_client():
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            get(f"{args.url}/")
+            elapsed = time.monotonic() - start
+            with lock:
+                probe_latencies.append(elapsed)
+
+    threads = [threading.Thread(target=login_client) for _ in range(args.login_clients)]
+    threads += [threading.Thread(target=probe_client) for _ in range(args.probe_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"Duration: {args.duration:.0f}s, login clients: {args.login_clients}, probe clients: {args.probe_clients}")
+    print(f"Successful logins/s: {len(login_latencies) / args.duration:.1f}")
+    print(f"Login responses by status: {dict(sorted(login_statuses.items()))}")
+    for name, latencies in (('login', login_latencies), ('GET /', probe_latencies)):
+        print(f"{name} latency ms: p50={percentile(latencies, 50) * 1000:.1f} "
+              f"p95={percentile(latencies, 95) * 1000:.1f} p99={percentile(latencies, 99) * 1000:.1f} "
+              f"(n={len(latencies)})")
+
+
+if __name__ == '__main__':
+    main()